@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''
+Author :
+    * Muhammed Ahad <ahad3112@yahoo.com, maaahad@gmail.com>
+
+Start-up time of the generator: every command is run as a fresh process with the current
+interpreter, the minimum and the median wall time over all runs and the exit status are reported.
+Pass --baseline to time the same commands in another checkout (e.g. a git worktree of an
+older commit) with the same interpreter and environment.
+
+Usage:
+    $ python3 benchmarks/startup.py [--runs N] [--baseline <checkout>]
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# generator arguments -> label
+COMMANDS = [
+    (['--help'], '--help'),
+    (['--validate', '--ubuntu', '18.04'], '--validate'),
+]
+
+
+def time_command(checkout, args, runs):
+    '''
+    (wall times in ms, exit status of the last run) of running the generator in checkout with args
+    '''
+    command = [sys.executable, os.path.join(checkout, 'gromacs_docker_builds.py')] + args
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(command, cwd=checkout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000.0)
+    return (times, process.returncode)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the start-up of gromacs_docker_builds.py')
+    parser.add_argument('--runs', type=int, default=20, help='runs per command (default: 20).')
+    parser.add_argument('--baseline', type=str, help='checkout to compare against.')
+    args = parser.parse_args()
+
+    checkouts = [('current', ROOT)] + ([('baseline', os.path.abspath(args.baseline))] if args.baseline else [])
+
+    print('{0:<12} {1:<10} {2:>10} {3:>10} {4:>7}'.format('command', 'checkout', 'min ms', 'median ms', 'status'))
+    for (command, label) in COMMANDS:
+        for (name, checkout) in checkouts:
+            (times, status) = time_command(checkout, command, args.runs)
+            print('{0:<12} {1:<10} {2:>10.1f} {3:>10.1f} {4:>7}'.format(label, name, min(times),
+                                                                         statistics.median(times), status))
@@ -52,3 +52,22 @@ LIBRARY_SUFFIX_FORMAT = '{mpi}{double}{rdtscp}'
 
 
 WRAPPER_SUFFIX_FORMAT = '{mpi}{double}'
+
+
+# Per node type engine preference written by gmx-calibrate and used by gmx_chooser.py
+GMX_CALIBRATION_ENVIRONMENT_VARIABLE = 'GMX_CALIBRATION_FILE'
+GMX_CALIBRATION_FILE_NAME = '.gmx_calibration.json'
+GMX_CALIBRATION_FILE = os.path.join(os.path.expanduser('~'), GMX_CALIBRATION_FILE_NAME)
+
+# Opt-in launch tracing and mdrun performance summary of gmx_chooser.py
+GMX_CHOOSER_TRACE_ENVIRONMENT_VARIABLE = 'GMX_CHOOSER_TRACE'
+GMX_CHOOSER_METRICS_ENVIRONMENT_VARIABLE = 'GMX_CHOOSER_METRICS'
+
+# Wrapper binaries: python wrapper around gmx_chooser.py or generated POSIX sh dispatcher
+LAUNCHER_OPTIONS = ['python', 'sh']
+DEFAULT_LAUNCHER = 'python'
+
+# Build plan for a matrix of images (docker buildx bake)
+BAKE_FORMAT_OPTIONS = ['hcl', 'json']
+DEFAULT_BAKE_FORMAT = 'hcl'
+DEFAULT_BAKE_OUTPUT = 'bake'
@@ -0,0 +1,194 @@
+'''
+Author :
+    * Muhammed Ahad <ahad3112@yahoo.com, maaahad@gmail.com>
+
+Build plan for a matrix of image configurations: a Dockerfile per configuration and a
+docker buildx bake file building all of them concurrently with shared toolchain stages.
+
+Matrix file:
+    {
+        "repository": "gromacs/gromacs",
+        "cache": "registry.example.org/gromacs/cache",
+        "targets": {
+            "avx2": ["--gromacs", "2020.1", "--ubuntu", "18.04", "--engines", "simd=avx2:rdtscp=on"],
+            "sse2": {"args": ["--gromacs", "2020.1", "--ubuntu", "18.04", "--engines", "simd=sse2:rdtscp=off"],
+                     "tags": ["gromacs/gromacs:2020.1-sse2", "gromacs/gromacs:latest-sse2"]}
+        }
+    }
+
+Target names may only contain letters, digits, "_" and "-" (bake target names), the default
+tag is <repository>:<target name>. "cache" is optional, without it the layer cache is kept in
+the plan directory.
+'''
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+
+from utilities.cli import CLI
+
+
+class BuildPlan:
+    '''
+    Render every configuration of the matrix and describe the builds as bake targets
+    '''
+    # name of the stage building the toolchain in the generated Dockerfiles (DevelopmentStage.stage_name,
+    # the deployment stage of the images starts from it)
+    toolchain_stage = 'dev_stage'
+    context = '.'
+
+    def __init__(self, *, matrix, output, render=True):
+        self.output = output
+        self.render = render
+        with open(matrix) as f:
+            matrix = json.load(f, object_pairs_hook=collections.OrderedDict)
+
+        self.repository = matrix.get('repository')
+        self.cache = matrix.get('cache')
+        self.targets = collections.OrderedDict()
+        # toolchain key -> name of the first target using it
+        self.toolchains = collections.OrderedDict()
+
+        for (name, target) in matrix.get('targets', {}).items():
+            self.__add_target(name=name, target=target)
+
+    def __add_target(self, *, name, target):
+        if not re.match(r'^[A-Za-z0-9_-]+$', name):
+            raise RuntimeError('Input Error: target name "{0}" may only contain letters, digits, "_" and "-".'.format(name))
+
+        args = target['args'] if isinstance(target, dict) else target
+        tags = target.get('tags') if isinstance(target, dict) else None
+        if not tags:
+            if not self.repository:
+                raise RuntimeError('Input Error: target "{0}" has no tags and the matrix has no repository.'.format(name))
+            tags = ['{0}:{1}'.format(self.repository, name)]
+
+        cli = CLI(parser=argparse.ArgumentParser(prog=name), args=args)
+        if cli.args.bake_matrix:
+            raise RuntimeError('Input Error: target "{0}" can not be a build plan itself.'.format(name))
+        if cli.args.dep_format != 'docker':
+            raise RuntimeError('Input Error: target "{0}" is not a docker target.'.format(name))
+
+        cli.validate()
+
+        stages = cli.get_stages()
+        toolchain = self.__get_toolchain_key(stages['DevelopmentStage'])
+        self.toolchains.setdefault(toolchain, name)
+
+        self.targets[name] = {
+            'dockerfile': self.__render(stages) if self.render else None,
+            'tags': tags,
+            'toolchain': toolchain,
+        }
+
+    @staticmethod
+    def __get_toolchain_key(development_args):
+        '''
+        Configurations with the same development stage arguments share the toolchain stage
+        '''
+        serialized = json.dumps(development_args, sort_keys=True)
+        return hashlib.sha1(serialized.encode()).hexdigest()[:12]
+
+    @staticmethod
+    def __render(stages):
+        # hpccm is only needed once a recipe is actually rendered
+        import container.recipes as recipes
+
+        dockerfile = io.StringIO()
+        with contextlib.redirect_stdout(dockerfile):
+            recipes.generate(stages)
+        return dockerfile.getvalue()
+
+    def __get_dockerfile_path(self, name):
+        return os.path.join(self.output, name + '.Dockerfile')
+
+    def __get_cache(self, name):
+        '''
+        (cache-from, cache-to) of one target
+        '''
+        if self.cache:
+            ref = 'type=registry,ref={0}:{1}'.format(self.cache, name)
+            return (ref, ref + ',mode=max')
+
+        directory = os.path.join(self.output, 'cache', name)
+        return ('type=local,src=' + directory, 'type=local,dest={0},mode=max'.format(directory))
+
+    def bake(self):
+        '''
+        Bake definition: one target per toolchain (built once, cached with mode=max)
+        and one target per image, reading its own and its toolchain's cache
+        '''
+        targets = collections.OrderedDict()
+        for (toolchain, name) in self.toolchains.items():
+            cache_from, cache_to = self.__get_cache('toolchain-' + toolchain)
+            targets['toolchain-' + toolchain] = collections.OrderedDict([
+                ('context', self.context),
+                ('dockerfile', self.__get_dockerfile_path(name)),
+                ('target', self.toolchain_stage),
+                ('cache-from', [cache_from]),
+                ('cache-to', [cache_to]),
+            ])
+
+        for (name, target) in self.targets.items():
+            cache_from, cache_to = self.__get_cache(name)
+            toolchain_cache_from = self.__get_cache('toolchain-' + target['toolchain'])[0]
+            targets[name] = collections.OrderedDict([
+                ('context', self.context),
+                ('dockerfile', self.__get_dockerfile_path(name)),
+                ('tags', target['tags']),
+                ('cache-from', [cache_from, toolchain_cache_from]),
+                ('cache-to', [cache_to]),
+            ])
+
+        # the toolchain targets are part of the default group so that one bake invocation exports the
+        # toolchain caches, BuildKit builds the identical toolchain stage of the images only once
+        toolchains = ['toolchain-' + toolchain for toolchain in self.toolchains]
+        groups = collections.OrderedDict([
+            ('default', {'targets': toolchains + list(self.targets)}),
+            ('toolchains', {'targets': toolchains}),
+        ])
+
+        return collections.OrderedDict([('group', groups), ('target', targets)])
+
+    @staticmethod
+    def to_hcl(bake):
+        blocks = []
+        for block in ('group', 'target'):
+            for (name, attributes) in bake[block].items():
+                lines = ['{0} "{1}" {{'.format(block, name)]
+                lines += ['  {0} = {1}'.format(key, json.dumps(value)) for (key, value) in attributes.items()]
+                blocks.append('\n'.join(lines + ['}']))
+
+        return '\n\n'.join(blocks) + '\n'
+
+    @staticmethod
+    def to_json(bake):
+        return json.dumps(bake, indent=2) + '\n'
+
+    def write(self, *, fmt):
+        '''
+        Write the Dockerfiles and the bake file, return the path of the bake file
+        '''
+        if not self.render:
+            raise RuntimeError('Implementation Error: the build plan was not rendered.')
+
+        if not os.path.isdir(self.output):
+            os.makedirs(self.output)
+
+        for (name, target) in self.targets.items():
+            with open(self.__get_dockerfile_path(name), 'w') as f:
+                f.write(target['dockerfile'])
+
+        bake = self.bake()
+        path = os.path.join(self.output, 'docker-bake.' + fmt)
+        with open(path, 'w') as f:
+            if fmt == 'json':
+                f.write(self.to_json(bake))
+            else:
+                f.write(self.to_hcl(bake))
+
+        return path
@@ -6,12 +6,25 @@ Author :
 from __future__ import print_function
 import os
 import sys
-from distutils.version import StrictVersion
 
 import hpccm
 
 import config
 from utilities.cli import tools_order
+from utilities.version import version_checked
+
+
+def generate(stages):
+    '''
+    Print the container specification of the stages returned by CLI.get_stages
+    '''
+    previous_stage = None
+    for (stage, args) in stages.items():
+        try:
+            previous_stage = getattr(sys.modules[__name__], stage)(args=args, previous_stage=previous_stage)
+        except AttributeError as error:
+            # print(error)
+            pass
 
 
 class StageMixin:
@@ -75,16 +88,13 @@ class StageMixin:
         '''
         Static method to check the software verion
         '''
-        if StrictVersion(given) < StrictVersion(required):
-            raise RuntimeError('{tool} version not fulfilled: {given}. Minimum required version: {required}.'.format(
-                tool=tool,
-                given=given,
-                required=required
-            ))
-        return True
+        return version_checked(tool, required, given)
 
 
 class DevelopmentStage(StageMixin):
+    # the toolchain stage, the deployment stage starts from it
+    stage_name = 'dev_stage'
+
     def gcc(self, version):
         '''
         gcc compiler
@@ -109,7 +119,7 @@ class DevelopmentStage(StageMixin):
             # base image will be created in method cuda
             return
         else:
-            self.stage += hpccm.primitives.baseimage(image='ubuntu:' + version, _as='dev_stage')
+            self.stage += hpccm.primitives.baseimage(image='ubuntu:' + version, _as=DevelopmentStage.stage_name)
             if self.previous_stage:
                 self.stage += self.previous_stage._runtime()
 
@@ -121,7 +131,7 @@ class DevelopmentStage(StageMixin):
             # base image will be created in method cuda
             return
         else:
-            self.stage += hpccm.primitives.baseimage(image='centos:centos' + version, _as='dev_stage')
+            self.stage += hpccm.primitives.baseimage(image='centos:centos' + version, _as=DevelopmentStage.stage_name)
             if self.previous_stage:
                 self.stage += self.previous_stage._runtime()
 
@@ -137,7 +147,147 @@ class ApplicationStage(StageMixin):
 
 
 class DeploymentStage(StageMixin):
-    pass
+    stage_name = 'deploy'
+
+    # scripts installed next to the wrapper binaries: (source, installed name)
+    launcher_scripts = [
+        ('/scripts/gmx_chooser.py', 'gmx_chooser.py'),
+        # md.log parser used by gmx_chooser.py and gmx-calibrate
+        ('/scripts/gmx_mdlog.py', 'gmx_mdlog.py'),
+        # ensemble runner used by the ensemble subcommand of the wrappers
+        ('/scripts/gmx_ensemble.py', 'gmx_ensemble.py'),
+        # engine calibration entry point
+        ('/scripts/gmx_calibrate.py', 'gmx-calibrate'),
+    ]
+
+    # POSIX sh dispatcher: cpu flags are read with shell builtins, the engine table is precomputed
+    # and gmx_chooser.py handles everything else (tracing, metrics, calibration, ensemble)
+    dispatcher_header = [
+        '#!/bin/sh',
+        '# {wrapper}: generated by gromacs_docker_builds.py, {chooser} is the fallback',
+        'chooser={chooser}',
+        'case ${{{trace}:-0}}${{{metrics}:-0}} in 00) ;; *) exec "$chooser" "$0" "$@" ;; esac',
+        '[ -f "${{{calibration}:-$HOME/{calibration_file}}}" ] && exec "$chooser" "$0" "$@"',
+        '[ "$1" = ensemble ] && exec "$chooser" "$0" "$@"',
+        'flags=',
+        'while IFS= read -r line; do',
+        '    case $line in flags*) flags=" ${{line#*:}} "; break ;; esac',
+        'done < /proc/cpuinfo',
+        'has() {{ case $flags in *" $1 "*) return 0 ;; esac; return 1; }}',
+    ]
+    dispatcher_footer = ['exec "$chooser" "$0" "$@"']
+
+    def format(self, container_format):
+        '''
+        Start the deployment stage from the development stage, so that the development stage
+        only holds the toolchain and can be built and cached on its own
+        '''
+        # not a baseimage primitive: hpccm would guess (and reset) the linux distribution from the stage name
+        self.stage += hpccm.primitives.raw(docker='FROM {image} AS {name}'.format(image=DevelopmentStage.stage_name,
+                                                                                 name=DeploymentStage.stage_name))
+
+    def launcher(self, launcher):
+        '''
+        Install the wrapper binaries of the engines (python wrappers or generated
+        POSIX sh dispatchers), gmx_chooser.py and its helpers
+        '''
+        suffix = {
+            'mpi': config.GMX_ENGINE_SUFFIX_OPTIONS['mpi'] if self.args.get('mpi') else '',
+            'double': config.GMX_ENGINE_SUFFIX_OPTIONS['double'] if self.double else '',
+        }
+
+        wrappers = []
+        engine_binaries = []
+        for engine in self.args.get('engines', []):
+            gmx = 'mdrun' if engine.get('mdrun', 'off').lower() == 'on' else 'gmx'
+            rdtscp = config.GMX_ENGINE_SUFFIX_OPTIONS['rdtscp'] if engine['rdtscp'].lower() == 'on' else ''
+            binary = gmx + config.BINARY_SUFFIX_FORMAT.format(rdtscp=rdtscp, **suffix)
+            engine_binaries.append((engine['simd'], os.path.join(config.GMX_BINARY_DIRECTORY.format(engine['simd']), binary)))
+
+            wrapper = gmx + config.WRAPPER_SUFFIX_FORMAT.format(**suffix)
+            if wrapper not in wrappers:
+                wrappers.append(wrapper)
+
+        for primitive in self.get_launcher_primitives(wrappers=wrappers, engine_binaries=engine_binaries, launcher=launcher):
+            self.stage += primitive
+
+    @staticmethod
+    def get_launcher_primitives(*, wrappers, engine_binaries, launcher):
+        '''
+        hpccm primitives installing the wrapper binaries and the launcher scripts
+        '''
+        wrappers_directory = os.path.join(config.GMX_INSTALLATION_DIRECTORY, 'bin')
+        chooser = os.path.join(wrappers_directory, 'gmx_chooser.py')
+
+        # create the wrapper binaries directory
+        primitives = [hpccm.primitives.shell(commands=['mkdir -p {}'.format(wrappers_directory)])]
+
+        for wrapper in wrappers:
+            wrapper_path = os.path.join(wrappers_directory, wrapper)
+            if launcher == 'sh':
+                dispatcher = DeploymentStage.get_dispatcher(wrapper=wrapper, engine_binaries=engine_binaries, chooser=chooser)
+                primitives.append(hpccm.primitives.shell(commands=['printf \'%s\\n\' {lines} > {path}'.format(
+                    lines=' '.join("'" + line.replace("'", "'\\''") + "'" for line in dispatcher),
+                    path=wrapper_path
+                )]))
+            else:
+                primitives.append(hpccm.primitives.copy(src='/scripts/wrapper.py', dest=wrapper_path))
+
+        for (src, name) in DeploymentStage.launcher_scripts:
+            primitives.append(hpccm.primitives.copy(src=src, dest=os.path.join(wrappers_directory, name)))
+
+        # chmod
+        primitives.append(hpccm.primitives.shell(commands=['chmod +x {}'.format(os.path.join(wrappers_directory, '*'))]))
+        # copying config file
+        primitives.append(hpccm.primitives.copy(src='config.py', dest=os.path.join(wrappers_directory, 'config.py')))
+        # environment variable
+        primitives.append(hpccm.primitives.environment(variables={'PATH': '$PATH:{}'.format(wrappers_directory)}))
+
+        return primitives
+
+    @staticmethod
+    def get_dispatcher(*, wrapper, engine_binaries, chooser):
+        '''
+        Lines of the POSIX sh dispatcher for a wrapper binary. Engines are tried in the order
+        gmx_chooser.py would choose them: widest SIMD first, rdtscp builds first within a SIMD.
+        '''
+        rdtscp = config.GMX_ENGINE_SUFFIX_OPTIONS['rdtscp']
+        base, other = ('mdrun', 'gmx') if wrapper.startswith('mdrun') else ('gmx', 'mdrun')
+        alternative = wrapper.replace(base, other, 1)
+        names = [wrapper + rdtscp, alternative + rdtscp, wrapper, alternative]
+        architectures = dict(zip(config.GMX_BINARY_DIRECTORY_SUFFIX, config.ARCHITECTURES))
+
+        candidates = [(simd, path) for (simd, path) in engine_binaries
+                      if simd in architectures and os.path.basename(path) in names]
+        candidates.sort(key=lambda candidate: (config.ARCHITECTURES.index(architectures[candidate[0]]),
+                                               names.index(os.path.basename(candidate[1]))))
+
+        lines = [line.format(wrapper=wrapper,
+                             chooser=chooser,
+                             trace=config.GMX_CHOOSER_TRACE_ENVIRONMENT_VARIABLE,
+                             metrics=config.GMX_CHOOSER_METRICS_ENVIRONMENT_VARIABLE,
+                             calibration=config.GMX_CALIBRATION_ENVIRONMENT_VARIABLE,
+                             calibration_file=config.GMX_CALIBRATION_FILE_NAME) for line in DeploymentStage.dispatcher_header]
+
+        for (simd, path) in candidates:
+            gmx = os.path.basename(path)
+            conditions = ['has ' + architectures[simd]]
+            if gmx.endswith(rdtscp):
+                conditions.append('has rdtscp')
+            conditions.append('[ -x {0} ]'.format(path))
+            run = 'exec {0} "$@"'.format(path)
+
+            if gmx.startswith(other) and other == 'mdrun':
+                # gmx mdrun ... runs on an mdrun only installation without the subcommand
+                conditions.insert(0, '[ "$1" = mdrun ]')
+                run = 'shift; ' + run
+            elif gmx.startswith(other):
+                # mdrun ... runs on a full installation as gmx mdrun ...
+                run = 'exec {0} mdrun "$@"'.format(path)
+
+            lines.append('if {conditions}; then {run}; fi'.format(conditions=' && '.join(conditions), run=run))
+
+        return lines + DeploymentStage.dispatcher_footer
 
 
 class BuildRecipes:
@@ -239,13 +389,7 @@ class BuildRecipes:
 
     @staticmethod
     def version_checked(tool, required, given):
-        if StrictVersion(given) < StrictVersion(required):
-            raise RuntimeError('Invalid {tool} version: {given}. Minimum required version: {required}.'.format(
-                tool=tool,
-                given=given,
-                required=required
-            ))
-        return True
+        return version_checked(tool, required, given)
 
 
 class GromacsRecipes(BuildRecipes):
@@ -292,10 +436,11 @@ class GromacsRecipes(BuildRecipes):
                 -DGMX_LIBS_SUFFIX=$libs_suffix$ \
                 "
 
-    # list of wrapper binaries
-    wrappers = []
-
     def __init__(self, *, cli):
+        # list of wrapper binaries
+        self.wrappers = []
+        # (simd, binary path) of every engine, used by the generated sh dispatchers
+        self.engine_binaries = []
         BuildRecipes.__init__(self, cli=cli)
         # initiate build stage
         self.__initiate_build_stage()
@@ -319,6 +464,8 @@ class GromacsRecipes(BuildRecipes):
 
             # wrapper binary ... appropriate suffix will be added later
             self.wrappers.append('mdrun') if engine['mdrun'].lower() == 'on' else self.wrappers.append('gmx')
+            self.engine_binaries.append((engine['simd'], os.path.join(config.GMX_BINARY_DIRECTORY.format(engine['simd']),
+                                                                      self.wrappers[-1] + bin_libs_suffix)))
 
             # simd, rdtscp, mdrun
             for key in engine:
@@ -377,29 +524,11 @@ class GromacsRecipes(BuildRecipes):
         self.stages['deploy'] += hpccm.building_blocks.packages(ospackages=self.os_packages)
         self.stages['deploy'] += self.stages[build_stage].runtime()
 
-        # setting wrapper binaries
-        # create the wrapper binaries directory
-        wrappers_directory = os.path.join(config.GMX_INSTALLATION_DIRECTORY, 'bin')
-        self.stages['deploy'] += hpccm.primitives.shell(commands=['mkdir -p {}'.format(wrappers_directory)])
-
-        for wrapper in self.wrappers:
-            wrapper_path = os.path.join(wrappers_directory, wrapper)
-            self.stages['deploy'] += hpccm.primitives.copy(src='/scripts/wrapper.py',
-                                                           dest=wrapper_path)
-
-        # setting the gmx_chooser script
-        self.stages['deploy'] += hpccm.primitives.copy(src='/scripts/gmx_chooser.py',
-                                                       dest=os.path.join(wrappers_directory, 'gmx_chooser.py'))
-        # chmod
-        self.stages['deploy'] += hpccm.primitives.shell(commands=['chmod +x {}'.format(
-            os.path.join(wrappers_directory, '*')
-        )])
-
-        # copying config file
-        self.stages['deploy'] += hpccm.primitives.copy(src='config.py',
-                                                       dest=os.path.join(wrappers_directory, 'config.py'))
-        # environment variable
-        self.stages['deploy'] += hpccm.primitives.environment(variables={'PATH': '$PATH:{}'.format(wrappers_directory)})
+        # wrapper binaries, gmx_chooser.py and its helpers
+        for primitive in DeploymentStage.get_launcher_primitives(wrappers=self.wrappers,
+                                                                 engine_binaries=self.engine_binaries,
+                                                                 launcher=self.cli.args.dep_launcher):
+            self.stages['deploy'] += primitive
 
         self.stages['deploy'] += hpccm.primitives.label(metadata={'gromacs.version': self.cli.args.gromacs})
 
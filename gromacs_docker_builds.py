@@ -9,20 +9,28 @@ Usage:
 '''
 
 import argparse
+import json
+
 from utilities.cli import CLI
-import container.recipes as recipes
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='HPCCM recipes for GROMACS container')
-    stages = CLI(parser=parser).get_stages()
-
-    previous_stage = None
-    for (stage, args) in stages.items():
-        try:
-            previous_stage = getattr(recipes, stage)(args=args, previous_stage=previous_stage)
-        except AttributeError as error:
-            # print(error)
-            pass
+    cli = CLI(parser=parser)
+
+    # hpccm is only imported when a recipe is actually rendered
+    if cli.args.bake_matrix:
+        from container.plan import BuildPlan
+
+        # Dockerfiles and bake file for a matrix of images
+        plan = BuildPlan(matrix=cli.args.bake_matrix, output=cli.args.bake_output, render=not cli.args.validate)
+        print(json.dumps(plan.bake(), indent=2) if cli.args.validate else plan.write(fmt=cli.args.bake_format))
+    elif cli.args.validate:
+        cli.validate()
+        print(json.dumps({'stages': cli.get_stages(), 'engines': cli.gromacs_engines}, indent=2))
+    else:
+        import container.recipes as recipes
+
+        recipes.generate(cli.get_stages())
 
     # GromacsRecipes(cli=cli)
 
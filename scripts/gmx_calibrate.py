@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+'''
+Run a short water box benchmark with every installed GROMACS engine and store the
+engines ranked by ns/day as the preference of this node type. gmx_chooser.py uses
+that preference ahead of matching the cpu flags.
+
+Usage:
+    $ gmx-calibrate -h/--help
+'''
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+import gmx_chooser
+import gmx_mdlog
+
+
+ENGINE_PATTERN = re.compile('^(gmx|mdrun)({mpi})?({double})?({rdtscp})?$'.format(**config.GMX_ENGINE_SUFFIX_OPTIONS))
+
+TOPOLOGY = '''#include "oplsaa.ff/forcefield.itp"
+#include "oplsaa.ff/spce.itp"
+
+[ system ]
+gmx-calibrate water box
+
+[ molecules ]
+SOL {waters}
+'''
+
+MDP = '''integrator      = md
+dt              = 0.002
+nsteps          = {nsteps}
+cutoff-scheme   = Verlet
+coulombtype     = PME
+rcoulomb        = 1.0
+rvdw            = 1.0
+tcoupl          = v-rescale
+tc-grps         = System
+tau-t           = 0.1
+ref-t           = 300
+gen-vel         = yes
+gen-temp        = 300
+nstlog          = 0
+nstenergy       = 0
+nstcalcenergy   = 100
+'''
+
+
+def get_engines(flags):
+    '''
+    Installed engines that can run on this cpu, widest SIMD first
+    '''
+    engines = []
+    for (arch, bin_suffix) in zip(config.ARCHITECTURES, config.GMX_BINARY_DIRECTORY_SUFFIX):
+        bin_dir = config.GMX_BINARY_DIRECTORY.format(bin_suffix)
+        if arch not in flags or not os.path.isdir(bin_dir):
+            continue
+        for gmx in sorted(os.listdir(bin_dir)):
+            match = ENGINE_PATTERN.match(gmx)
+            if not match:
+                continue
+            if match.group(4) and gmx_chooser.RDTSCP not in flags:
+                continue
+            if gmx_chooser.is_executable(os.path.join(bin_dir, gmx)):
+                engines.append(os.path.join(bin_dir, gmx))
+
+    return engines
+
+
+def call(command, workdir):
+    process = subprocess.run(command, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError('Command failed: {0}\n{1}'.format(' '.join(command), process.stdout))
+
+
+def prepare_system(gmx, workdir, box, nsteps):
+    '''
+    Generate the benchmark run input with gmx solvate and grompp, nothing is downloaded
+    '''
+    call([gmx, 'solvate', '-cs', 'spc216.gro', '-box', str(box), str(box), str(box), '-o', 'water.gro'], workdir)
+
+    with open(os.path.join(workdir, 'water.gro')) as f:
+        f.readline()
+        atoms = int(f.readline())
+
+    with open(os.path.join(workdir, 'topol.top'), 'w') as f:
+        f.write(TOPOLOGY.format(waters=atoms // 3))
+    with open(os.path.join(workdir, 'bench.mdp'), 'w') as f:
+        f.write(MDP.format(nsteps=nsteps))
+
+    call([gmx, 'grompp', '-f', 'bench.mdp', '-c', 'water.gro', '-p', 'topol.top', '-o', 'bench.tpr'], workdir)
+
+    return os.path.join(workdir, 'bench.tpr')
+
+
+def benchmark(engine, tpr, workdir):
+    '''
+    Run one engine on the benchmark system, return ns/day or None on failure
+    '''
+    gmx = os.path.basename(engine)
+    name = os.path.basename(os.path.dirname(engine)) + '.' + gmx
+    command = [engine] + (['mdrun'] if gmx.startswith('gmx') else [])
+    command += ['-s', tpr, '-deffnm', name, '-resethway', '-noconfout']
+    if config.GMX_ENGINE_SUFFIX_OPTIONS['mpi'] not in gmx:
+        # the small box does not decompose well, use a single thread-MPI rank and OpenMP threads
+        command += ['-ntmpi', '1']
+
+    try:
+        call(command, workdir)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        return None
+
+    return gmx_mdlog.get_ns_per_day(os.path.join(workdir, name + '.log'))
+
+
+def save_preference(calibration_file, node_type, results):
+    try:
+        with open(calibration_file) as f:
+            preferences = json.load(f)
+    except (IOError, OSError, ValueError):
+        preferences = {}
+
+    preferences[node_type] = {
+        'engines': [{'path': engine, 'ns_per_day': ns_per_day} for (engine, ns_per_day) in results],
+        'time': time.time(),
+    }
+
+    directory = os.path.dirname(os.path.abspath(calibration_file))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # write and rename, so that a running gmx_chooser.py never reads a partial file
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.gmx_calibration')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(preferences, f, indent=2, sort_keys=True)
+    os.replace(tmp, calibration_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='gmx-calibrate',
+                                     description='Benchmark every installed GROMACS engine and store the fastest for this node type')
+    parser.add_argument('--box', type=float, default=4.0, help='edge of the cubic water box in nm (default: 4.0).')
+    parser.add_argument('--nsteps', type=int, default=5000, help='number of MD steps per engine (default: 5000).')
+    parser.add_argument('--output', type=str, default=gmx_chooser.get_calibration_file(),
+                        help='preference file (default: ${0} or {1}).'.format(config.GMX_CALIBRATION_ENVIRONMENT_VARIABLE,
+                                                                             config.GMX_CALIBRATION_FILE))
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark directory.')
+    args = parser.parse_args()
+
+    flags = os.popen('cat /proc/cpuinfo | grep ^flags | head -1').read()
+    engines = get_engines(flags)
+    tools = [engine for engine in engines if os.path.basename(engine).startswith('gmx')]
+    if not tools:
+        parser.exit(status=1, message='No full GROMACS installation available to prepare the benchmark. Exiting...\n')
+
+    workdir = tempfile.mkdtemp(prefix='gmx-calibrate.')
+    try:
+        # the narrowest SIMD build is the one most likely to run anywhere
+        tpr = prepare_system(gmx=tools[-1], workdir=workdir, box=args.box, nsteps=args.nsteps)
+
+        results = []
+        for engine in engines:
+            ns_per_day = benchmark(engine, tpr, workdir)
+            print('{0:<60} {1}'.format(engine, 'failed' if ns_per_day is None else '{0:.3f} ns/day'.format(ns_per_day)))
+            if ns_per_day is not None:
+                results.append((engine, ns_per_day))
+    except RuntimeError as error:
+        parser.exit(status=1, message='{0}\n'.format(error))
+    finally:
+        if args.keep:
+            print('Benchmark directory: ' + workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if not results:
+        parser.exit(status=1, message='No engine finished the benchmark. Exiting...\n')
+
+    results.sort(key=lambda result: result[1], reverse=True)
+    node_type = gmx_chooser.get_node_type()
+    save_preference(args.output, node_type, results)
+    print('Fastest engine on "{0}": {1}'.format(node_type, results[0][0]))
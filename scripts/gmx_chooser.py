@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 import sys
 import os
+import time
 import config
 
 
 RDTSCP = 'rdtscp'
 
+# Opt-in launch tracing: unset/empty/0 disables it, 1 or 'stderr' writes to stderr,
+# any other value is taken as the path of an append-only trace file
+TRACE_ENVIRONMENT_VARIABLE = config.GMX_CHOOSER_TRACE_ENVIRONMENT_VARIABLE
+
+# Opt-in performance summary after mdrun: unset/empty/0 disables it, 1 writes <log name>.metrics.json
+# next to each md.log, any other value is taken as the path of an append-only JSON lines file
+METRICS_ENVIRONMENT_VARIABLE = config.GMX_CHOOSER_METRICS_ENVIRONMENT_VARIABLE
+
 
 # Checking whether a file is executable or not
 def is_executable(file):
@@ -17,36 +26,104 @@ def is_executable(file):
 
 
 # Choose the best possible GROMACS based on cpu's SIMD instruction
-def get_binary_directory(flags, gmx):
+# If rejected is a list, every candidate that is skipped is recorded there with the reason
+def get_binary_directory(flags, gmx, rejected=None):
     for (index, (arch, bin_suffix)) in enumerate(zip(config.ARCHITECTURES, config.GMX_BINARY_DIRECTORY_SUFFIX)):
         bin_dir = config.GMX_BINARY_DIRECTORY.format(bin_suffix)
-        if arch in flags and os.path.exists(bin_dir):
+        if arch not in flags:
+            reason = 'cpu flag {0} missing'.format(arch)
+        elif not os.path.exists(bin_dir):
+            reason = 'directory missing'
+        else:
             fileshere = os.listdir(bin_dir)
             try:
                 idx = fileshere.index(gmx)
             except ValueError:
-                continue
+                reason = 'binary missing'
             else:
                 file = fileshere[idx]
                 if is_executable(os.path.join(bin_dir, file)):
                     return (index, bin_dir)
                 else:
-                    continue
+                    reason = 'not executable'
+
+        if rejected is not None:
+            rejected.append({'path': os.path.join(bin_dir, gmx), 'reason': reason})
+    return (None, None)
+
+
+def get_calibration_file():
+    return os.environ.get(config.GMX_CALIBRATION_ENVIRONMENT_VARIABLE, config.GMX_CALIBRATION_FILE)
+
+
+# Node type used as the key of the calibration file
+def get_node_type():
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except (IOError, OSError):
+        pass
+
+    return 'unknown'
+
+
+# Choose the fastest engine measured by gmx-calibrate on this node type
+def get_preferred_binary(gromacs, rejected=None):
+    calibration_file = get_calibration_file()
+    if not os.path.exists(calibration_file):
+        return (None, None)
+
+    import json
+
+    try:
+        with open(calibration_file) as f:
+            preferences = json.load(f)
+        engines = preferences.get(get_node_type(), {}).get('engines', [])
+    except (IOError, OSError, ValueError, AttributeError):
+        return (None, None)
+    if not isinstance(engines, list):
+        # a malformed preference must not prevent GROMACS from running, fall back to flag matching
+        return (None, None)
+
+    for engine in engines:
+        try:
+            bin_dir, gmx = os.path.split(engine['path'])
+        except (KeyError, TypeError, AttributeError):
+            # same for a malformed entry
+            return (None, None)
+        if gmx not in gromacs:
+            continue
+        if is_executable(engine['path']):
+            bin_suffix = os.path.basename(bin_dir).split('.', 1)[-1]
+            index = config.GMX_BINARY_DIRECTORY_SUFFIX.index(bin_suffix) \
+                if bin_suffix in config.GMX_BINARY_DIRECTORY_SUFFIX else None
+            return ((index, bin_dir), gmx)
+        elif rejected is not None:
+            rejected.append({'path': engine['path'], 'reason': 'calibrated binary not executable'})
+
     return (None, None)
 
 
 def run(binary_directory, gmx, args):
     binary_path = os.path.join(binary_directory, gmx)
-    os.system(binary_path + ' ' + ' '.join(args))
+    return os.system(binary_path + ' ' + ' '.join(args))
 
 
-def get_possible_gmx_directory(flags, gmx, chosen_dir, chosen_gmx, chosen_args):
-    binary_directory = get_binary_directory(flags=flags, gmx=gmx)
+def get_possible_gmx_directory(flags, gmx, chosen_dir, chosen_gmx, chosen_args, rejected=None):
+    binary_directory = get_binary_directory(flags=flags, gmx=gmx, rejected=rejected)
     if binary_directory[1]:
         if chosen_gmx:
             if chosen_dir[0] > binary_directory[0]:
+                if rejected is not None:
+                    rejected.append({'path': os.path.join(chosen_dir[1], chosen_gmx),
+                                     'reason': 'narrower SIMD than ' + os.path.join(binary_directory[1], gmx)})
                 return (binary_directory, gmx, sys.argv[2:])
             else:
+                if rejected is not None:
+                    rejected.append({'path': os.path.join(binary_directory[1], gmx),
+                                     'reason': 'not better than ' + os.path.join(chosen_dir[1], chosen_gmx)})
                 return (chosen_dir, chosen_gmx, chosen_args)
         else:
             return (binary_directory, gmx, sys.argv[2:])
@@ -54,30 +131,164 @@ def get_possible_gmx_directory(flags, gmx, chosen_dir, chosen_gmx, chosen_args):
         return (chosen_dir, chosen_gmx, chosen_args)
 
 
-if __name__ == '__main__':
-    sys.argv[1] = os.path.split(sys.argv[1])[1]
-
+def get_cpu_flags():
     pipe = os.popen('cat /proc/cpuinfo | grep ^flags | head -1')
-    flags = pipe.read()
+    return pipe.read()
 
-    rdtscp_enabled = True if RDTSCP in flags else False
 
-    gromacs = [sys.argv[1]]
+# Candidate binaries for the wrapper in argv[1], rdtscp builds first
+def get_gromacs_candidates(argv, flags):
+    gromacs = [argv[1]]
 
-    if 'mdrun' in sys.argv or 'mdrun_mpi' in sys.argv:
-        if sys.argv[1].startswith('mdrun'):
+    if 'mdrun' in argv or 'mdrun_mpi' in argv:
+        if argv[1].startswith('mdrun'):
             gromacs.append(gromacs[0].replace('mdrun', 'gmx'))
-        elif sys.argv[1].startswith('gmx'):
-            if len(sys.argv) > 2 and sys.argv[2].startswith('mdrun'):
+        elif argv[1].startswith('gmx'):
+            if len(argv) > 2 and argv[2].startswith('mdrun'):
                 gromacs.append(gromacs[0].replace('gmx', 'mdrun'))
 
-    if rdtscp_enabled:
+    if RDTSCP in flags:
         gromacs_rdtscp = [gmx + config.GMX_ENGINE_SUFFIX_OPTIONS['rdtscp'] for gmx in gromacs]
         gromacs = gromacs_rdtscp + gromacs
 
+    return gromacs
+
+
+# Return (chosen_dir, chosen_gmx, calibrated) among the candidate binaries
+def choose_binary(gromacs, flags, rejected=None):
+    # the measured preference of this node type (gmx-calibrate) comes ahead of flag matching
+    preferred_dir, preferred_gmx = get_preferred_binary(gromacs, rejected=rejected)
+    if preferred_gmx:
+        return (preferred_dir, preferred_gmx, True)
+
     chosen_dir, chosen_gmx, chosen_args = None, None, None
     for gmx in gromacs:
-        (chosen_dir, chosen_gmx, chosen_args) = get_possible_gmx_directory(flags, gmx, chosen_dir, chosen_gmx, chosen_args)
+        (chosen_dir, chosen_gmx, chosen_args) = get_possible_gmx_directory(flags, gmx, chosen_dir, chosen_gmx, chosen_args,
+                                                                           rejected=rejected)
+    return (chosen_dir, chosen_gmx, False)
+
+
+def get_trace_destination():
+    '''
+    Return None when tracing is off, sys.stderr or the path of the trace file otherwise
+    '''
+    destination = os.environ.get(TRACE_ENVIRONMENT_VARIABLE, '').strip()
+    if destination in ('', '0'):
+        return None
+    elif destination in ('1', 'stderr'):
+        return sys.stderr
+
+    return destination
+
+
+def write_trace(destination, record):
+    '''
+    Write one JSON line per launch. Tracing must never prevent GROMACS from running.
+    '''
+    import json
+
+    line = json.dumps(record, sort_keys=True) + '\n'
+    try:
+        if destination is sys.stderr:
+            sys.stderr.write(line)
+            sys.stderr.flush()
+        else:
+            # O_APPEND keeps lines from concurrent launches intact
+            fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+    except (IOError, OSError) as error:
+        sys.stderr.write('{0}: could not write trace: {1}\n'.format(TRACE_ENVIRONMENT_VARIABLE, error))
+
+
+def get_mdrun_logs(args):
+    '''
+    md.log files written by mdrun for the given mdrun arguments
+    '''
+    log, deffnm, multidir = None, None, []
+    for (index, arg) in enumerate(args):
+        value = args[index + 1] if index + 1 < len(args) else None
+        if arg == '-g':
+            log = value
+        elif arg == '-deffnm':
+            deffnm = value
+        elif arg == '-multidir':
+            for directory in args[index + 1:]:
+                if directory.startswith('-'):
+                    break
+                multidir.append(directory)
+
+    if not log:
+        log = deffnm + '.log' if deffnm else 'md.log'
+
+    return [os.path.join(directory, log) for directory in multidir] if multidir else [log]
+
+
+def write_metrics(destination, logs, binary_path, status, since):
+    '''
+    Write the performance summary of every md.log updated by this launch
+    '''
+    import json
+    import gmx_mdlog
+
+    gmx = os.path.basename(binary_path)
+    for log in logs:
+        if not os.path.exists(log) or os.path.getmtime(log) < since:
+            continue
+
+        metrics = gmx_mdlog.parse(log)
+        metrics.setdefault('simd', os.path.basename(os.path.dirname(binary_path)).split('.', 1)[-1])
+        metrics.setdefault('rdtscp', gmx.endswith(config.GMX_ENGINE_SUFFIX_OPTIONS['rdtscp']))
+        metrics.update({'engine': binary_path, 'log': os.path.abspath(log), 'exit_status': status})
+
+        try:
+            if destination == '1':
+                with open(os.path.splitext(log)[0] + '.metrics.json', 'w') as f:
+                    json.dump(metrics, f, indent=2, sort_keys=True)
+            else:
+                with open(destination, 'a') as f:
+                    f.write(json.dumps(metrics, sort_keys=True) + '\n')
+        except (IOError, OSError) as error:
+            sys.stderr.write('{0}: could not write metrics: {1}\n'.format(METRICS_ENVIRONMENT_VARIABLE, error))
+
+
+if __name__ == '__main__':
+    trace_destination = get_trace_destination()
+    rejected = [] if trace_destination else None
+    detection_start = time.time()
+
+    sys.argv[1] = os.path.split(sys.argv[1])[1]
+
+    flags = get_cpu_flags()
+
+    if len(sys.argv) > 2 and sys.argv[2] == 'ensemble':
+        # many independent mdrun jobs sharing this node
+        import gmx_ensemble
+        sys.exit(gmx_ensemble.main(wrapper=sys.argv[1], args=sys.argv[3:], flags=flags))
+
+    selection_start = time.time()
+
+    gromacs = get_gromacs_candidates(sys.argv, flags)
+    chosen_dir, chosen_gmx, calibrated = choose_binary(gromacs, flags, rejected=rejected)
+    chosen_args = sys.argv[2:]
+
+    selection_end = time.time()
+
+    if trace_destination:
+        write_trace(trace_destination, {
+            'wrapper': sys.argv[1],
+            'flags': [flag for flag in config.ARCHITECTURES + [RDTSCP] if flag in flags],
+            'candidates': gromacs,
+            'rejected': rejected,
+            'chosen': os.path.join(chosen_dir[1], chosen_gmx) if chosen_gmx else None,
+            'calibrated': calibrated,
+            'detection_ms': round((selection_start - detection_start) * 1000, 3),
+            'selection_ms': round((selection_end - selection_start) * 1000, 3),
+            'pid': os.getpid(),
+            'time': detection_start,
+        })
 
     if not chosen_gmx:
         print('No appropriate GROMACS installaiton available. Exiting...')
@@ -92,5 +303,13 @@ if __name__ == '__main__':
         if chosen_gmx.startswith('gmx'):
             chosen_args.insert(0, 'mdrun')
 
+    metrics_destination = os.environ.get(METRICS_ENVIRONMENT_VARIABLE, '').strip()
+    mdrun = chosen_gmx.startswith('mdrun') or (chosen_args and chosen_args[0] == 'mdrun')
+    launch_time = time.time()
+
     # running the binary
-    run(binary_directory=chosen_dir[1], gmx=chosen_gmx, args=chosen_args)
+    status = run(binary_directory=chosen_dir[1], gmx=chosen_gmx, args=chosen_args)
+
+    if mdrun and metrics_destination not in ('', '0'):
+        write_metrics(metrics_destination, get_mdrun_logs(chosen_args), os.path.join(chosen_dir[1], chosen_gmx),
+                      status=os.WEXITSTATUS(status) if os.WIFEXITED(status) else status, since=launch_time)
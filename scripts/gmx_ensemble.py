@@ -0,0 +1,198 @@
+'''
+Author :
+    * Muhammed Ahad <ahad3112@yahoo.com, maaahad@gmail.com>
+
+Run many small independent mdrun jobs on one node. The engine is resolved once, the cores
+available to this process are split into equal slots and every slot is kept busy until all
+run directories are done.
+
+Usage:
+    $ gmx ensemble [--slots N] [-ntomp N] <run directory> ... [-- <mdrun arguments>]
+'''
+import argparse
+import os
+import subprocess
+import time
+
+import config
+import gmx_chooser
+import gmx_mdlog
+
+
+# output of each mdrun, written inside its run directory
+OUTPUT = 'ensemble.out'
+
+
+def read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().split()
+    except (IOError, OSError):
+        return None
+
+
+def get_cpu_quota():
+    '''
+    Number of cpus allowed by the cgroup cpu quota, None when unlimited
+    '''
+    # cgroup v2
+    cpu_max = read_first_line('/sys/fs/cgroup/cpu.max')
+    if cpu_max and cpu_max[0] != 'max':
+        return max(1, int(float(cpu_max[0]) / float(cpu_max[1])))
+
+    # cgroup v1
+    quota = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota[0]) > 0:
+        return max(1, int(float(quota[0]) / float(period[0])))
+
+    return None
+
+
+def get_available_cpus():
+    '''
+    Cpus this process may run on: the affinity mask (which includes the cgroup cpuset),
+    limited by the cgroup cpu quota
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+
+    quota = get_cpu_quota()
+    return cpus[:quota] if quota else cpus
+
+
+def get_slots(cpus, runs, slots=None, ntomp=None):
+    '''
+    Split the cpus into equal slots, one list of cpus per slot
+    '''
+    if slots is None:
+        slots = len(cpus) // ntomp if ntomp else min(runs, len(cpus))
+    slots = max(1, slots)
+    if ntomp is None:
+        ntomp = max(1, len(cpus) // slots)
+
+    if slots * ntomp > len(cpus):
+        raise RuntimeError('{0} slots of {1} threads do not fit on the {2} available cpus.'.format(slots, ntomp, len(cpus)))
+
+    return [cpus[slot * ntomp:(slot + 1) * ntomp] for slot in range(slots)]
+
+
+def get_slot_arguments(slot_cpus):
+    '''
+    mdrun threading arguments for one slot. The slot is pinned through the affinity of the
+    process (see launch): mdrun counts -pinoffset in its own logical core order, which is not
+    the OS cpu numbering on SMT nodes or cpusets that do not start at cpu 0.
+    '''
+    return ['-ntomp', str(len(slot_cpus)), '-pin', 'off']
+
+
+def launch(command, directory, slot_cpus):
+    with open(os.path.join(directory, OUTPUT), 'w') as output:
+        return subprocess.Popen(command, cwd=directory, stdout=output, stderr=subprocess.STDOUT,
+                                preexec_fn=lambda: os.sched_setaffinity(0, slot_cpus))
+
+
+def report(directories, logs, statuses, start):
+    '''
+    Print the aggregate throughput of the ensemble. Only successful runs count, and only
+    their logs written since start (not stale logs of earlier runs).
+    '''
+    wall_time = time.time() - start
+    simulated_ns = 0.0
+    for directory in directories:
+        if statuses.get(directory) != 0:
+            continue
+        for log in logs:
+            path = os.path.join(directory, log)
+            if not os.path.exists(path) or os.path.getmtime(path) < start:
+                continue
+            metrics = gmx_mdlog.parse(path)
+            if 'ns_per_day' in metrics and 'wall_time_s' in metrics:
+                simulated_ns += metrics['ns_per_day'] * metrics['wall_time_s'] / 86400.0
+
+    failed = [directory for directory in directories if statuses.get(directory) != 0]
+    print('Runs           : {0} ({1} failed)'.format(len(directories), len(failed)))
+    for directory in failed:
+        print('    failed     : {0} (see {1})'.format(directory, os.path.join(directory, OUTPUT)))
+    print('Wall time      : {0:.1f} s'.format(wall_time))
+    print('Runs per hour  : {0:.1f}'.format(len(directories) * 3600.0 / wall_time if wall_time else 0.0))
+    print('Aggregate      : {0:.3f} ns/day'.format(simulated_ns * 86400.0 / wall_time if wall_time else 0.0))
+
+    return 1 if failed else 0
+
+
+def main(*, wrapper, args, flags):
+    if '--' in args:
+        mdrun_args = args[args.index('--') + 1:]
+        args = args[:args.index('--')]
+    else:
+        mdrun_args = []
+
+    parser = argparse.ArgumentParser(prog='{0} ensemble'.format(wrapper),
+                                     description='Run mdrun in every run directory, several at a time on this node.',
+                                     epilog='Arguments after -- are passed to every mdrun.')
+    parser.add_argument('directories', nargs='+', metavar='directory', help='run directory containing the run input.')
+    parser.add_argument('--slots', type=int, help='number of concurrent runs (default: available cpus / ntomp).')
+    parser.add_argument('-ntomp', type=int, help='OpenMP threads per run (default: available cpus / slots).')
+    args = parser.parse_args(args)
+    for (option, value) in (('--slots', args.slots), ('-ntomp', args.ntomp)):
+        if value is not None and value < 1:
+            parser.error('{0} must be at least 1'.format(option))
+
+    # resolve the engine once for every run
+    argv = [None, wrapper, 'mdrun'] if wrapper.startswith('gmx') else [None, wrapper]
+    chosen_dir, chosen_gmx, _ = gmx_chooser.choose_binary(gmx_chooser.get_gromacs_candidates(argv, flags), flags)
+    if not chosen_gmx:
+        print('No appropriate GROMACS installaiton available. Exiting...')
+        return 1
+
+    command = [os.path.join(chosen_dir[1], chosen_gmx)] + (['mdrun'] if chosen_gmx.startswith('gmx') else [])
+    if config.GMX_ENGINE_SUFFIX_OPTIONS['mpi'] not in chosen_gmx:
+        command += ['-ntmpi', '1']
+
+    unusable = [directory for directory in args.directories
+                if not os.path.isdir(directory) or not os.access(directory, os.W_OK | os.X_OK)]
+    if unusable:
+        parser.error('not a writable run directory: {0}'.format(', '.join(unusable)))
+
+    cpus = get_available_cpus()
+    try:
+        slots = get_slots(cpus, len(args.directories), slots=args.slots, ntomp=args.ntomp)
+    except RuntimeError as error:
+        parser.error(str(error))
+
+    print('Engine         : {0}'.format(command[0]))
+    print('Slots          : {0} x {1} threads'.format(len(slots), len(slots[0])))
+
+    queue = list(args.directories)
+    free = list(range(len(slots)))
+    running = {}
+    statuses = {}
+    start = time.time()
+    while queue or running:
+        while queue and free:
+            slot = free.pop(0)
+            directory = queue.pop(0)
+            try:
+                process = launch(command + get_slot_arguments(slots[slot]) + mdrun_args, directory, slots[slot])
+            except OSError as error:
+                print('Could not start mdrun in {0}: {1}'.format(directory, error))
+                statuses[directory] = -1
+                free.append(slot)
+                continue
+            running[process.pid] = (process, slot, directory)
+
+        if not running:
+            continue
+        pid, status = os.wait()
+        if pid not in running:
+            continue
+        process, slot, directory = running.pop(pid)
+        # os.wait already reaped the child, keep Popen from waiting for it again
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+        statuses[directory] = process.returncode
+        free.append(slot)
+
+    return report(args.directories, gmx_chooser.get_mdrun_logs(mdrun_args), statuses, start)
@@ -0,0 +1,85 @@
+'''
+Author :
+    * Muhammed Ahad <ahad3112@yahoo.com, maaahad@gmail.com>
+
+Performance metrics from the md.log written by GROMACS mdrun
+'''
+import re
+
+
+CYCLE_ACCOUNTING_HEADER = 'R E A L   C Y C L E   A N D   T I M E   A C C O U N T I N G'
+CYCLE_ACCOUNTING_ROW = re.compile(r'^ (?P<name>\S.*?)\s{2,}(?P<numbers>[-\d.]+(\s+[-\d.]+)*)\s*$')
+
+# md.log line prefix -> (metric, parser)
+LINE_METRICS = [
+    (re.compile(r'^GROMACS version:\s+(.+)$'), 'version', str),
+    (re.compile(r'^SIMD instructions:\s+(\S+)'), 'simd', str),
+    (re.compile(r'^RDTSCP usage:\s+(\S+)'), 'rdtscp', lambda value: value == 'enabled'),
+    (re.compile(r'^Using (\d+) MPI (?:thread|process)'), 'ranks', int),
+    (re.compile(r'^Using (\d+) OpenMP thread'), 'threads', int),
+    (re.compile(r'^\s*Average PME mesh/force load:\s+([\d.]+)'), 'pme_mesh_force_load', float),
+    (re.compile(r'^\s*Average load imbalance:\s+([\d.]+)\s*%'), 'load_imbalance_percent', float),
+]
+
+
+def get_ns_per_day(log):
+    '''
+    ns/day reported on the Performance line of md.log, None if the run did not finish
+    '''
+    return parse(log).get('ns_per_day')
+
+
+def parse(log, top=5):
+    '''
+    Parse md.log into a dictionary. The last run in an appended log wins.
+    Only the top entries (by percentage of the run time) of the cycle accounting are kept.
+    '''
+    metrics = {}
+    try:
+        with open(log) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return metrics
+
+    cycles = None
+    separators = 0
+    for line in lines:
+        if CYCLE_ACCOUNTING_HEADER in line:
+            # start of the (last) cycle accounting table
+            cycles, separators = [], 0
+            continue
+
+        if cycles is not None and separators < 2:
+            if line.startswith('-----'):
+                separators += 1
+                continue
+            match = CYCLE_ACCOUNTING_ROW.match(line)
+            if separators == 1 and match:
+                numbers = [float(number) for number in match.group('numbers').split()]
+                if len(numbers) >= 3:
+                    cycles.append({'name': match.group('name'),
+                                   'wall_time_s': numbers[-3],
+                                   'giga_cycles': numbers[-2],
+                                   'percent': numbers[-1]})
+            continue
+
+        for (pattern, metric, convert) in LINE_METRICS:
+            match = pattern.match(line)
+            if match:
+                metrics[metric] = convert(match.group(1).strip())
+
+        if line.strip().startswith('Time:'):
+            try:
+                metrics['core_time_s'], metrics['wall_time_s'] = [float(value) for value in line.split()[1:3]]
+            except ValueError:
+                pass
+        elif line.startswith('Performance:'):
+            try:
+                metrics['ns_per_day'], metrics['hour_per_ns'] = [float(value) for value in line.split()[1:3]]
+            except ValueError:
+                pass
+
+    if cycles:
+        metrics['cycles'] = sorted(cycles, key=lambda row: row['percent'], reverse=True)[:top]
+
+    return metrics
@@ -0,0 +1,47 @@
+group "default" {
+  targets = ["toolchain-4b6d29c0aa7a", "toolchain-7bab686b9541", "avx2", "sse2", "focal-mpi"]
+}
+
+group "toolchains" {
+  targets = ["toolchain-4b6d29c0aa7a", "toolchain-7bab686b9541"]
+}
+
+target "toolchain-4b6d29c0aa7a" {
+  context = "."
+  dockerfile = "bake/avx2.Dockerfile"
+  target = "dev_stage"
+  cache-from = ["type=local,src=bake/cache/toolchain-4b6d29c0aa7a"]
+  cache-to = ["type=local,dest=bake/cache/toolchain-4b6d29c0aa7a,mode=max"]
+}
+
+target "toolchain-7bab686b9541" {
+  context = "."
+  dockerfile = "bake/focal-mpi.Dockerfile"
+  target = "dev_stage"
+  cache-from = ["type=local,src=bake/cache/toolchain-7bab686b9541"]
+  cache-to = ["type=local,dest=bake/cache/toolchain-7bab686b9541,mode=max"]
+}
+
+target "avx2" {
+  context = "."
+  dockerfile = "bake/avx2.Dockerfile"
+  tags = ["gromacs/gromacs:avx2"]
+  cache-from = ["type=local,src=bake/cache/avx2", "type=local,src=bake/cache/toolchain-4b6d29c0aa7a"]
+  cache-to = ["type=local,dest=bake/cache/avx2,mode=max"]
+}
+
+target "sse2" {
+  context = "."
+  dockerfile = "bake/sse2.Dockerfile"
+  tags = ["gromacs/gromacs:2020.1-sse2", "gromacs/gromacs:latest-sse2"]
+  cache-from = ["type=local,src=bake/cache/sse2", "type=local,src=bake/cache/toolchain-4b6d29c0aa7a"]
+  cache-to = ["type=local,dest=bake/cache/sse2,mode=max"]
+}
+
+target "focal-mpi" {
+  context = "."
+  dockerfile = "bake/focal-mpi.Dockerfile"
+  tags = ["gromacs/gromacs:focal-mpi"]
+  cache-from = ["type=local,src=bake/cache/focal-mpi", "type=local,src=bake/cache/toolchain-7bab686b9541"]
+  cache-to = ["type=local,dest=bake/cache/focal-mpi,mode=max"]
+}
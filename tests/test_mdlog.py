@@ -0,0 +1,58 @@
+'''
+Tests of the md.log parser used by gmx_chooser.py, gmx-calibrate and the ensemble runner
+'''
+import os
+import sys
+import unittest
+
+# the launcher scripts are installed side by side in the image, not as a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import gmx_mdlog  # noqa: E402
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class MdlogTest(unittest.TestCase):
+    def setUp(self):
+        self.log = os.path.join(DATA, 'md.log')
+
+    def test_parse(self):
+        self.assertEqual(gmx_mdlog.parse(self.log), {
+            'version': '2020.1',
+            'simd': 'AVX2_256',
+            'rdtscp': True,
+            'ranks': 1,
+            'threads': 8,
+            'load_imbalance_percent': 2.1,
+            'pme_mesh_force_load': 0.745,
+            'core_time_s': 105.84,
+            'wall_time_s': 13.23,
+            'ns_per_day': 65.312,
+            'hour_per_ns': 0.367,
+            'cycles': [
+                {'name': 'Force', 'wall_time_s': 7.912, 'giga_cycles': 205.51, 'percent': 59.8},
+                {'name': 'PME mesh', 'wall_time_s': 3.111, 'giga_cycles': 80.807, 'percent': 23.5},
+                {'name': 'Constraints', 'wall_time_s': 0.622, 'giga_cycles': 16.156, 'percent': 4.7},
+                {'name': 'Update', 'wall_time_s': 0.451, 'giga_cycles': 11.715, 'percent': 3.4},
+                {'name': 'Rest', 'wall_time_s': 0.421, 'giga_cycles': 10.935, 'percent': 3.2},
+            ],
+        })
+
+    def test_cycles(self):
+        # neither the Total row nor the PME breakdown sub-table are part of the cycle accounting
+        names = [row['name'] for row in gmx_mdlog.parse(self.log, top=100)['cycles']]
+        self.assertEqual(names, ['Force', 'PME mesh', 'Constraints', 'Update', 'Rest', 'Neighbor search',
+                                 'NB X/F buffer ops.'])
+
+    def test_missing_log(self):
+        self.assertEqual(gmx_mdlog.parse(os.path.join(DATA, 'missing.log')), {})
+        self.assertIsNone(gmx_mdlog.get_ns_per_day(os.path.join(DATA, 'missing.log')))
+
+    def test_ns_per_day(self):
+        self.assertEqual(gmx_mdlog.get_ns_per_day(self.log), 65.312)
+
+
+if __name__ == '__main__':
+    unittest.main()
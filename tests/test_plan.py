@@ -0,0 +1,67 @@
+'''
+Golden tests of the docker buildx bake plan. The plan is built with render=False,
+so neither hpccm nor a Docker daemon is needed. The rendered Dockerfiles are only
+checked when hpccm is installed.
+'''
+import importlib.util
+import os
+import re
+import unittest
+
+from container.plan import BuildPlan
+
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class BuildPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.plan = BuildPlan(matrix=os.path.join(DATA, 'matrix.json'), output='bake', render=False)
+
+    def assertGolden(self, output, golden):
+        with open(os.path.join(DATA, golden)) as f:
+            self.assertEqual(output, f.read())
+
+    def test_hcl(self):
+        self.assertGolden(BuildPlan.to_hcl(self.plan.bake()), 'docker-bake.hcl')
+
+    def test_json(self):
+        self.assertGolden(BuildPlan.to_json(self.plan.bake()), 'docker-bake.json')
+
+    def test_write_needs_rendering(self):
+        with self.assertRaises(RuntimeError):
+            self.plan.write(fmt='hcl')
+
+
+@unittest.skipUnless(importlib.util.find_spec('hpccm'), 'hpccm is not installed')
+class RenderedDockerfileTest(unittest.TestCase):
+    def setUp(self):
+        self.plan = BuildPlan(matrix=os.path.join(DATA, 'matrix.json'), output='bake')
+
+    @staticmethod
+    def get_stages(dockerfile):
+        '''
+        stage name -> instructions (the lines after its FROM)
+        '''
+        stages = {}
+        for block in re.split(r'^(?=FROM )', dockerfile, flags=re.MULTILINE):
+            if block.startswith('FROM '):
+                lines = block.splitlines()
+                stages[lines[0].split()[-1]] = lines[1:]
+        return stages
+
+    def test_toolchain_stage(self):
+        for (name, target) in self.plan.targets.items():
+            stages = self.get_stages(target['dockerfile'])
+            self.assertEqual(list(stages), [BuildPlan.toolchain_stage, 'deploy'], name)
+            self.assertIn('FROM {0} AS deploy'.format(BuildPlan.toolchain_stage), target['dockerfile'])
+
+            # the toolchain stage does not install anything of the deployment
+            toolchain = '\n'.join(stages[BuildPlan.toolchain_stage])
+            self.assertNotIn('COPY', toolchain, name)
+            self.assertNotIn('/usr/local/gromacs', toolchain, name)
+            self.assertIn('cmake', toolchain, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
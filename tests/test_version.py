@@ -0,0 +1,83 @@
+'''
+Tests of the version comparison replacing distutils.version.StrictVersion
+and of the version checks of --validate
+'''
+import argparse
+import contextlib
+import io
+import unittest
+
+from utilities.cli import CLI
+from utilities.version import Version, version_checked
+
+
+class VersionTest(unittest.TestCase):
+    def test_ordering(self):
+        self.assertLess(Version('3.9.6'), Version('3.10'))
+        self.assertLess(Version('1.6.0'), Version('3.0.0'))
+        self.assertGreater(Version('8'), Version('7.5'))
+        self.assertEqual(sorted(['3.10', '3.9.6', '3', '3.9'], key=Version), ['3', '3.9', '3.9.6', '3.10'])
+
+    def test_padding(self):
+        self.assertEqual(Version('1.0'), Version('1'))
+        self.assertEqual(Version('1.0.0'), '1')
+        self.assertEqual(hash(Version('1.0')), hash(Version('1')))
+        self.assertLessEqual(Version('1'), Version('1.0'))
+        self.assertNotEqual(Version('1.0.1'), Version('1'))
+
+    def test_prerelease(self):
+        self.assertLess(Version('2.0a1'), Version('2.0b1'))
+        self.assertLess(Version('2.0b1'), Version('2.0rc1'))
+        self.assertLess(Version('2.0rc1'), Version('2.0'))
+        self.assertLess(Version('2.0b1'), Version('2.0b2'))
+        self.assertGreater(Version('2.0a1'), Version('1.9'))
+
+    def test_invalid(self):
+        for version in ('', 'abc', '1.', '.1', '1.2.x', '1.0-beta', '1.0c1', None):
+            with self.assertRaises(ValueError, msg=repr(version)):
+                Version(version)
+
+    def test_not_a_version(self):
+        # comparison with anything that is not a version is left to the other operand
+        self.assertEqual(Version('1').__eq__(None), NotImplemented)
+        self.assertEqual(Version('1').__lt__('abc'), NotImplemented)
+        self.assertFalse(Version('1') == None)  # noqa: E711
+        self.assertTrue(Version('1') != 'abc')
+        with self.assertRaises(TypeError):
+            Version('1') < None
+
+    def test_version_checked(self):
+        self.assertTrue(version_checked('CMake', '3.9.6', '3.10'))
+        self.assertTrue(version_checked('CMake', '3.9.6', '3.9.6'))
+        with self.assertRaisesRegex(RuntimeError, 'CMake version not fulfilled: 3.1. Minimum required version: 3.9.6.'):
+            version_checked('CMake', '3.9.6', '3.1')
+
+
+class ValidateTest(unittest.TestCase):
+    def validate(self, args):
+        cli = CLI(parser=argparse.ArgumentParser(prog='gromacs_docker_builds.py'), args=args)
+        return cli.validate()
+
+    def assertValidateError(self, args, message):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as exit:
+            self.validate(args)
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn(message, stderr.getvalue())
+
+    def test_valid(self):
+        self.assertTrue(self.validate(['--ubuntu', '18.04', '--cmake', '3.10', '--openmpi', '3.0.0']))
+
+    def test_old_version(self):
+        self.assertValidateError(['--ubuntu', '18.04', '--cmake', '3.1'],
+                                 'error: CMake version not fulfilled: 3.1. Minimum required version: 3.9.6.')
+        self.assertValidateError(['--ubuntu', '18.04', '--openmpi', '1.4'],
+                                 'error: openmpi version not fulfilled: 1.4.')
+
+    def test_invalid_version(self):
+        self.assertValidateError(['--ubuntu', '18.04', '--cmake', 'latest'],
+                                 "error: CMake: invalid version number 'latest'")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import os
 import collections
 
 import config
+from utilities.version import version_checked
 
 
 # Specifying the ordering of the tools
@@ -20,18 +21,20 @@ tools_order = [
     'openmpi',
     'impi',
     'fftw',
-    'gromacs'
+    'gromacs',
     'format',
+    'launcher',
 ]
 
 
 class CLI:
-    def __init__(self, *, parser):
+    def __init__(self, *, parser, args=None):
         self.parser = parser
         # Setting Command line arguments
         self.__set_software_options()
-        # Parsing command line arguments
-        self.args = self.parser.parse_args()
+        self.__set_build_plan_options()
+        # Parsing command line arguments (sys.argv unless args is given)
+        self.args = self.parser.parse_args(args)
         # Advances parsing and sanity check for command line options: [engines, ]
         self.gromacs_engines = self.__parse_gromacs_engines()
 
@@ -56,6 +59,10 @@ class CLI:
 
         self.parser.add_argument('--double', dest='dev_app_double', action='store_true', help='enable double precision.')
         self.parser.add_argument('--regtest', dest='app_regtest', action='store_true', help='enable regression testing.')
+        self.parser.add_argument('--launcher', dest='dep_launcher', type=str, default=config.DEFAULT_LAUNCHER,
+                                 choices=config.LAUNCHER_OPTIONS,
+                                 help='wrapper binaries: python chooser or generated POSIX sh dispatcher (default: {0}).'.format(
+                                     config.DEFAULT_LAUNCHER))
 
         # set mutually exclusive options
         self.__set_mpi_options()
@@ -64,6 +71,19 @@ class CLI:
         # set gromacs engine specification
         self.__set_gromacs_engines()
 
+    def __set_build_plan_options(self):
+        self.parser.add_argument('--validate', dest='validate', action='store_true',
+                                 help='only check the options and print the resulting stages (or bake plan), '
+                                      'no recipe is rendered.')
+        self.parser.add_argument('--bake-matrix', dest='bake_matrix', type=str, metavar='FILE',
+                                 help='JSON file of image configurations. Write a Dockerfile per configuration and a '
+                                      'docker buildx bake file for the whole matrix instead of printing a Dockerfile.')
+        self.parser.add_argument('--bake-format', dest='bake_format', type=str, default=config.DEFAULT_BAKE_FORMAT,
+                                 choices=config.BAKE_FORMAT_OPTIONS,
+                                 help='bake file format (default: {0}).'.format(config.DEFAULT_BAKE_FORMAT))
+        self.parser.add_argument('--bake-output', dest='bake_output', type=str, default=config.DEFAULT_BAKE_OUTPUT,
+                                 help='directory of the build plan (default: {0}).'.format(config.DEFAULT_BAKE_OUTPUT))
+
     def __set_mpi_options(self):
         mpi_group = self.parser.add_mutually_exclusive_group()
         mpi_group.add_argument('--openmpi', dest='dev_openmpi', type=str, help='enable and set OpenMPI version.')
@@ -133,6 +153,26 @@ class CLI:
                 raise self.parser.error('"{0}" is not valid value for key "{1}". \
                     Available options are :\n\t\t{2}'.format(value, key, config.ENGINE_OPTIONS[key]))
 
+    def validate(self):
+        '''
+        Check the software versions of the development stage without rendering any recipe.
+        The engines are already checked while parsing.
+        '''
+        minimum_versions = {
+            'cmake': ('CMake', config.CMAKE_MIN_REQUIRED_VERSION),
+            'openmpi': ('openmpi', config.OPENMPI_MIN_REQUIRED_VERSION),
+        }
+
+        development = self.get_stages()['DevelopmentStage']
+        for (tool, (name, required)) in minimum_versions.items():
+            if tool in development:
+                try:
+                    version_checked(name, required, development[tool])
+                except (RuntimeError, ValueError) as error:
+                    self.parser.error('{0}: {1}'.format(name, error) if isinstance(error, ValueError) else str(error))
+
+        return True
+
     def get_stages(self):
         '''
         This method will create list of stages required for generating Container specifications
@@ -156,4 +196,9 @@ class CLI:
                 if 'dep' in key:
                     stages['DeploymentStage'][key[key.rfind('_') + 1:]] = value
 
+        # The deployment stage installs the wrapper binaries, named after the engines and their suffixes
+        stages['DeploymentStage']['engines'] = self.gromacs_engines
+        stages['DeploymentStage']['mpi'] = bool(self.args.dev_openmpi or self.args.dev_impi)
+        stages['DeploymentStage']['double'] = self.args.dev_app_double
+
         return stages
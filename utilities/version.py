@@ -0,0 +1,83 @@
+'''
+Author :
+    * Muhammed Ahad <ahad3112@yahoo.com, maaahad@gmail.com>
+
+Minimal software version comparison, replacing distutils.version.StrictVersion
+(distutils is not available in recent python versions and is slow to import)
+'''
+import functools
+import re
+
+
+@functools.total_ordering
+class Version:
+    '''
+    Version numbers such as "8", "3.9.6" or "2.0b1". Missing components compare as 0,
+    a pre-release (a, b, rc) is lower than the release itself.
+    '''
+    pattern = re.compile(r'^(\d+(?:\.\d+)*)(?:(a|b|rc)(\d+))?$')
+    # release sorts after any pre-release
+    prerelease_order = {'a': 0, 'b': 1, 'rc': 2, None: 3}
+
+    def __init__(self, version):
+        match = self.pattern.match(str(version).strip())
+        if not match:
+            raise ValueError('invalid version number \'{0}\''.format(version))
+
+        self.version = str(version).strip()
+        self.release = [int(component) for component in match.group(1).split('.')]
+        self.prerelease = (self.prerelease_order[match.group(2)], int(match.group(3) or 0))
+
+    @classmethod
+    def coerce(cls, other):
+        '''
+        other as a Version, None if it is not a version
+        '''
+        if isinstance(other, cls):
+            return other
+        try:
+            return cls(other)
+        except ValueError:
+            return None
+
+    def __key(self, length):
+        return tuple(self.release + [0] * (length - len(self.release))) + self.prerelease
+
+    def __eq__(self, other):
+        other = Version.coerce(other)
+        if other is None:
+            return NotImplemented
+        length = max(len(self.release), len(other.release))
+        return self.__key(length) == other.__key(length)
+
+    def __lt__(self, other):
+        other = Version.coerce(other)
+        if other is None:
+            return NotImplemented
+        length = max(len(self.release), len(other.release))
+        return self.__key(length) < other.__key(length)
+
+    def __hash__(self):
+        release = list(self.release)
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
+        return hash((tuple(release), self.prerelease))
+
+    def __str__(self):
+        return self.version
+
+    def __repr__(self):
+        return 'Version(\'{0}\')'.format(self.version)
+
+
+def version_checked(tool, required, given):
+    '''
+    Check the software version against the minimum required version
+    '''
+    if Version(given) < Version(required):
+        raise RuntimeError('{tool} version not fulfilled: {given}. Minimum required version: {required}.'.format(
+            tool=tool,
+            given=given,
+            required=required
+        ))
+    return True